@@ -0,0 +1,37 @@
+"""Add trigram index on items name
+
+Revision ID: fe396b321a62
+Revises: 52cd7631bf2b
+Create Date: 2026-10-16 09:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fe396b321a62'
+down_revision: Union[str, Sequence[str], None] = '52cd7631bf2b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Serves ItemRepository.search()'s lower(name) LIKE '%...%'
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_items_name_trgm',
+        'items',
+        [sa.text('lower(name) gin_trgm_ops')],
+        unique=False,
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The extension stays; other objects may depend on it
+    op.drop_index('ix_items_name_trgm', table_name='items', postgresql_using='gin')
@@ -184,7 +184,7 @@ async def complete_passkey_authentication(
     passkey_repo = PasskeyCredentialRepository(db)
     
     # Get credential by ID
-    credential = await passkey_repo.get_by_credential_id(response.id)
+    credential = await passkey_repo.get_by_credential_id(response.id, load_user=True)
     if not credential:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
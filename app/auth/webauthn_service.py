@@ -2,14 +2,15 @@
 import base64
 import hashlib
 import hmac
-import json
 import os
 import secrets
 import struct
-from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any, List, Tuple
+import time
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Tuple, Callable, Iterable
 
 import cbor2
+import orjson
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
@@ -18,26 +19,57 @@ from cryptography.exceptions import InvalidSignature
 from app.config import config
 
 
+_URLSAFE_TO_STANDARD = bytes.maketrans(b'-_', b'+/')
+
+# Fields the authenticator response must carry for each ceremony
+_REGISTRATION_RESPONSE_FIELDS = frozenset({'attestationObject', 'clientDataJSON'})
+_AUTHENTICATION_RESPONSE_FIELDS = frozenset({'authenticatorData', 'clientDataJSON', 'signature'})
+
+# Supported signature algorithms, shared by every service; frozen here and
+# copied into each response, since pydantic cannot serialize a mappingproxy
+_PUB_KEY_CRED_PARAMS = (
+    MappingProxyType({'alg': -7, 'type': 'public-key'}),   # ES256
+    MappingProxyType({'alg': -257, 'type': 'public-key'}), # RS256
+)
+
+_AUTHENTICATOR_SELECTION = MappingProxyType({
+    'authenticatorAttachment': 'platform',
+    'userVerification': 'required',
+    'residentKey': 'preferred'
+})
+
+
+def _credential_descriptor(cred_id: str) -> Dict[str, Any]:
+    """Build a PublicKeyCredentialDescriptor for an allow/exclude list."""
+    return {'type': 'public-key', 'id': cred_id, 'transports': ['internal']}
+
+
 class WebAuthnService:
     """Service for handling WebAuthn/FIDO2 passkey operations."""
     
-    def __init__(self, rp_id: str = "localhost", rp_name: str = "FastAPI Enterprise App"):
+    def __init__(self, rp_id: str = "localhost", rp_name: str = "FastAPI Enterprise App",
+                 clock: Callable[[], int] = time.monotonic_ns):
         self.rp_id = rp_id
         self.rp_name = rp_name
-        self.challenge_cache = {}  # In production, use Redis for this
+        self._clock = clock  # Monotonic nanoseconds; injectable for tests
+        # Origins accepted in clientDataJSON
+        self._expected_origins = frozenset(
+            {f'https://{rp_id}', f'http://{rp_id}:8000', 'http://localhost:8000'}
+        )
+        # user_id -> (monotonic deadline in ns, challenge)
+        self.challenge_cache: Dict[int, Tuple[int, str]] = {}  # In production, use Redis for this
+        # Relying Party entity for registration options; copied per call
+        self._rp = MappingProxyType({'name': rp_name, 'id': rp_id})
         
     def generate_challenge(self) -> str:
         """Generate a cryptographically secure challenge."""
-        challenge_bytes = secrets.token_bytes(32)
-        return base64.urlsafe_b64encode(challenge_bytes).decode('utf-8').rstrip('=')
+        # Always 32 bytes, so the encoding is 43 characters plus one '='
+        return base64.urlsafe_b64encode(secrets.token_bytes(32))[:43].decode('ascii')
     
     def store_challenge(self, user_id: int, challenge: str, expires_in: int = 300) -> None:
         """Store challenge for later verification."""
-        expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
-        self.challenge_cache[user_id] = {
-            'challenge': challenge,
-            'expires_at': expires_at
-        }
+        deadline = self._clock() + expires_in * 1_000_000_000
+        self.challenge_cache[user_id] = (deadline, challenge)
     
     def get_challenge(self, user_id: int) -> Optional[str]:
         """Retrieve stored challenge for user."""
@@ -45,63 +77,44 @@ class WebAuthnService:
         if not challenge_data:
             return None
         
-        if datetime.now(timezone.utc) > challenge_data['expires_at']:
+        deadline, challenge = challenge_data
+        if self._clock() > deadline:
             del self.challenge_cache[user_id]
             return None
         
-        return challenge_data['challenge']
+        return challenge
     
     def clear_challenge(self, user_id: int) -> None:
         """Clear stored challenge for user."""
         self.challenge_cache.pop(user_id, None)
     
     def create_registration_options(self, user_id: int, username: str, display_name: str, 
-                                    exclude_credentials: List[str] = None) -> Dict[str, Any]:
+                                    exclude_credentials: Optional[Iterable[str]] = None) -> Dict[str, Any]:
         """Create WebAuthn registration options."""
         challenge = self.generate_challenge()
         self.store_challenge(user_id, challenge)
         
-        user_handle = base64.urlsafe_b64encode(str(user_id).encode()).decode('utf-8').rstrip('=')
+        user_handle = base64.urlsafe_b64encode(b'%d' % user_id).rstrip(b'=').decode('ascii')
         
         options = {
             'challenge': challenge,
-            'rp': {
-                'name': self.rp_name,
-                'id': self.rp_id
-            },
+            'rp': dict(self._rp),
             'user': {
                 'id': user_handle,
                 'name': username,
                 'displayName': display_name
             },
-            'pubKeyCredParams': [
-                {'alg': -7, 'type': 'public-key'},   # ES256
-                {'alg': -257, 'type': 'public-key'}, # RS256
-            ],
+            'pubKeyCredParams': [dict(params) for params in _PUB_KEY_CRED_PARAMS],
             'timeout': 60000,
             'attestation': 'none',
-            'authenticatorSelection': {
-                'authenticatorAttachment': 'platform',
-                'userVerification': 'required',
-                'residentKey': 'preferred'
-            },
-            'excludeCredentials': []
+            'authenticatorSelection': dict(_AUTHENTICATOR_SELECTION),
+            'excludeCredentials': list(map(_credential_descriptor, exclude_credentials or ()))
         }
         
-        if exclude_credentials:
-            options['excludeCredentials'] = [
-                {
-                    'id': cred_id,
-                    'type': 'public-key',
-                    'transports': ['internal']
-                }
-                for cred_id in exclude_credentials
-            ]
-        
         return options
     
     def create_authentication_options(self, user_id: Optional[int] = None, 
-                                     allow_credentials: List[str] = None) -> Dict[str, Any]:
+                                     allow_credentials: Optional[Iterable[str]] = None) -> Dict[str, Any]:
         """Create WebAuthn authentication options."""
         challenge = self.generate_challenge()
         
@@ -112,25 +125,18 @@ class WebAuthnService:
             'challenge': challenge,
             'timeout': 60000,
             'rpId': self.rp_id,
-            'allowCredentials': [],
+            'allowCredentials': list(map(_credential_descriptor, allow_credentials or ())),
             'userVerification': 'required'
         }
         
-        if allow_credentials:
-            options['allowCredentials'] = [
-                {
-                    'id': cred_id,
-                    'type': 'public-key',
-                    'transports': ['internal']
-                }
-                for cred_id in allow_credentials
-            ]
-        
         return options, challenge
     
     def verify_registration_response(self, user_id: int, response: Dict[str, Any]) -> Tuple[bool, Optional[Dict[str, Any]]]:
         """Verify WebAuthn registration response."""
         try:
+            if not _REGISTRATION_RESPONSE_FIELDS.issubset(response.get('response') or ()):
+                return False, {'error': 'Missing required response fields'}
+            
             # Get stored challenge
             challenge = self.get_challenge(user_id)
             if not challenge:
@@ -141,15 +147,14 @@ class WebAuthnService:
             client_data_json = self._decode_base64url(response['response']['clientDataJSON'])
             
             # Parse client data
-            client_data = json.loads(client_data_json.decode('utf-8'))
+            client_data = orjson.loads(client_data_json)
             
             # Verify challenge
             if client_data.get('challenge') != challenge:
                 return False, {'error': 'Challenge mismatch'}
             
             # Verify origin (in production, be more strict about this)
-            expected_origins = [f'https://{self.rp_id}', f'http://{self.rp_id}:8000', 'http://localhost:8000']
-            if client_data.get('origin') not in expected_origins:
+            if client_data.get('origin') not in self._expected_origins:
                 return False, {'error': f'Invalid origin: {client_data.get("origin")}'}
             
             # Parse attestation object
@@ -204,21 +209,23 @@ class WebAuthnService:
                                      challenge: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
         """Verify WebAuthn authentication response."""
         try:
+            if not _AUTHENTICATION_RESPONSE_FIELDS.issubset(response.get('response') or ()):
+                return False, {'error': 'Missing required response fields'}
+            
             # Parse the authenticator response
             authenticator_data = self._decode_base64url(response['response']['authenticatorData'])
             client_data_json = self._decode_base64url(response['response']['clientDataJSON'])
             signature = self._decode_base64url(response['response']['signature'])
             
             # Parse client data
-            client_data = json.loads(client_data_json.decode('utf-8'))
+            client_data = orjson.loads(client_data_json)
             
             # Verify challenge
             if client_data.get('challenge') != challenge:
                 return False, {'error': 'Challenge mismatch'}
             
             # Verify origin
-            expected_origins = [f'https://{self.rp_id}', f'http://{self.rp_id}:8000', 'http://localhost:8000']
-            if client_data.get('origin') not in expected_origins:
+            if client_data.get('origin') not in self._expected_origins:
                 return False, {'error': f'Invalid origin: {client_data.get("origin")}'}
             
             # Verify RP ID hash
@@ -286,12 +293,10 @@ class WebAuthnService:
     
     def _decode_base64url(self, data: str) -> bytes:
         """Decode base64url string."""
-        # Add padding if needed
-        padding = 4 - (len(data) % 4)
-        if padding != 4:
-            data += '=' * padding
-        
-        return base64.urlsafe_b64decode(data)
+        # Map to the standard alphabet and restore the padding WebAuthn
+        # clients strip in one pass; (-n) & 3 is 0-3 chars
+        raw = data.encode('ascii')
+        return base64.b64decode(raw.translate(_URLSAFE_TO_STANDARD) + b'=' * (-len(raw) & 3))
 
 
 # Global instance
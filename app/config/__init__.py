@@ -20,6 +20,16 @@ class DatabaseConfig(BaseModel):
     max_overflow: int = 30
     pool_timeout: int = 30
     pool_recycle: int = 3600
+    pool_pre_ping: bool = True
+    
+    # Compiled SQL statement cache (LRU entries per engine)
+    query_cache_size: int = 500
+    
+    # PostgreSQL JIT; planning overhead outweighs the gain on short OLTP queries
+    jit: bool = True
+    
+    # Optional search_path for every connection (server default when unset)
+    search_path: Optional[str] = None
     
     @property
     def url(self) -> str:
@@ -122,6 +132,10 @@ def load_config() -> AppConfig:
         max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "30")),
         pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
         pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "3600")),
+        pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        query_cache_size=int(os.getenv("DB_QUERY_CACHE_SIZE", "500")),
+        jit=os.getenv("DB_JIT", "true").lower() == "true",
+        search_path=os.getenv("DB_SEARCH_PATH") or None,
     )
     
     # Cache configuration
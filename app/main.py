@@ -15,7 +15,7 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 
 from app.config import config
 from app.models.database import init_database, close_database
@@ -102,6 +102,7 @@ def create_application() -> FastAPI:
         version=config.version,
         debug=config.debug,
         lifespan=lifespan,
+        default_response_class=ORJSONResponse,
         docs_url="/docs" if config.environment != "production" else None,
         redoc_url="/redoc" if config.environment != "production" else None,
     )
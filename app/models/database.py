@@ -10,7 +10,7 @@ from typing import AsyncGenerator, Optional
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.pool import NullPool
-from sqlalchemy import event, text
+from sqlalchemy import event
 import asyncpg
 
 from app.config import config
@@ -42,6 +42,13 @@ class DatabaseManager:
                 self._is_connected = True
                 return
             
+            # Session settings applied by asyncpg when each connection opens
+            server_settings = {}
+            if not config.database.jit:
+                server_settings["jit"] = "off"
+            if config.database.search_path:
+                server_settings["search_path"] = config.database.search_path
+            
             # Real PostgreSQL connection
             self.engine = create_async_engine(
                 config.database.url,
@@ -49,6 +56,9 @@ class DatabaseManager:
                 max_overflow=config.database.max_overflow,
                 pool_timeout=config.database.pool_timeout,
                 pool_recycle=config.database.pool_recycle,
+                pool_pre_ping=config.database.pool_pre_ping,
+                query_cache_size=config.database.query_cache_size,
+                connect_args={"server_settings": server_settings},
                 echo=config.debug,
                 future=True,
             )
@@ -60,8 +70,8 @@ class DatabaseManager:
             )
             
             # Test the connection
-            async with self.engine.begin() as conn:
-                await conn.execute(text("SELECT 1"))
+            async with self.engine.connect() as conn:
+                await conn.exec_driver_sql("SELECT 1")
             
             logger.info(f"Database connection initialized successfully")
             logger.info(f"Database URL: {config.database.url}")
@@ -92,8 +102,9 @@ class DatabaseManager:
             if not self.session_factory:
                 return False
                 
-            async with self.session_factory() as session:
-                await session.execute(text("SELECT 1"))
+            # Ping through the driver: no session or statement compilation needed
+            async with self.engine.connect() as conn:
+                await conn.exec_driver_sql("SELECT 1")
                 return True
         except Exception as e:
             logger.error(f"Database health check failed: {e}")
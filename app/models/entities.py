@@ -6,7 +6,7 @@ import os
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, func, Text, ForeignKey, LargeBinary
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, func, Text, ForeignKey, LargeBinary, Index
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -68,6 +68,16 @@ class Item(Base):
         return f"<Item(id={self.id}, name='{self.name}', price={self.price})>"
 
 
+# Trigram index backing ItemRepository.search()'s lower(name) LIKE '%...%'.
+# Needs the pg_trgm extension; other dialects get a plain lower(name) index.
+Index(
+    "ix_items_name_trgm",
+    func.lower(Item.name).label("name_lower"),
+    postgresql_using="gin",
+    postgresql_ops={"name_lower": "gin_trgm_ops"},
+)
+
+
 class MockItem:
     """Mock Item model for when using mock database."""
     
@@ -98,6 +108,7 @@ def get_next_id() -> int:
 
 def reset_storage():
     """Reset mock storage (useful for testing)."""
-    global _items_storage, _next_id
-    _items_storage = {}
+    global _next_id
+    # Clear in place: repositories hold a reference to this dict
+    _items_storage.clear()
     _next_id = 1
\ No newline at end of file
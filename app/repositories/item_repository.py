@@ -5,10 +5,10 @@ Provides abstraction layer between business logic and data storage.
 import logging
 import os
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 
-from sqlalchemy import select, func, text
+from sqlalchemy import Select, select, func, text, insert, delete
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.models.entities import Item, MockItem, _items_storage, get_next_id
@@ -176,6 +176,51 @@ class ItemRepository(BaseRepository):
             self.logger.error(f"Error fetching items: {e}")
             raise
     
+    async def get_all_keyset(
+        self, after_id: Optional[int] = None, limit: int = 10
+    ) -> List[Item]:
+        """
+        Get a page of items ordered by ID, starting after ``after_id``.
+
+        Keyset pagination seeks straight to the next page via the primary key
+        index instead of scanning and discarding ``OFFSET`` rows, so every page
+        costs the same regardless of how deep it is.
+        """
+        try:
+            self.logger.debug(f"Fetching {limit} items after id: {after_id}")
+
+            if self.use_mock:
+                # Mock implementation
+                items = sorted(
+                    (item for item in _items_storage.values()
+                     if after_id is None or item.id > after_id),
+                    key=lambda x: x.id,
+                )[:limit]
+                self.logger.debug(f"Found {len(items)} items")
+                return items
+
+            query = select(Item).order_by(Item.id).limit(limit)
+            if after_id is not None:
+                query = query.where(Item.id > after_id)
+
+            if self.session:
+                result = await self.session.execute(query)
+                items = result.scalars().all()
+            else:
+                async with db_manager.get_session() as session:
+                    result = await session.execute(query)
+                    items = result.scalars().all()
+
+            self.logger.debug(f"Found {len(items)} items")
+            return list(items)
+
+        except SQLAlchemyError as e:
+            self.logger.error(f"Database error fetching items: {e}")
+            raise
+        except Exception as e:
+            self.logger.error(f"Error fetching items: {e}")
+            raise
+    
     async def create(self, item_data: ItemCreate) -> Item:
         """Create new item with validation."""
         try:
@@ -219,6 +264,37 @@ class ItemRepository(BaseRepository):
             self.logger.error(f"Error creating item: {e}")
             raise
     
+    async def bulk_create(self, items_data: List[ItemCreate]) -> List[Item]:
+        """Create several items with a single multi-row INSERT."""
+        try:
+            self.logger.debug(f"Creating {len(items_data)} items")
+
+            if self.use_mock:
+                # Mock implementation
+                return [await self.create(item_data) for item_data in items_data]
+
+            stmt = insert(Item).returning(Item)
+            rows = [item_data.model_dump() for item_data in items_data]
+            if self.session:
+                result = await self.session.scalars(stmt, rows)
+                items = result.all()
+                await self.session.commit()
+            else:
+                async with db_manager.get_session() as session:
+                    result = await session.scalars(stmt, rows)
+                    items = result.all()
+                    await session.commit()
+
+            self.logger.info(f"Created {len(items)} items")
+            return list(items)
+
+        except SQLAlchemyError as e:
+            self.logger.error(f"Database error creating items: {e}")
+            raise
+        except Exception as e:
+            self.logger.error(f"Error creating items: {e}")
+            raise
+
     async def update(self, item_id: int, item_data: ItemUpdate) -> Optional[Item]:
         """Update existing item."""
         try:
@@ -339,6 +415,52 @@ class ItemRepository(BaseRepository):
             self.logger.error(f"Error deleting item {item_id}: {e}")
             raise
     
+    async def bulk_delete(self, item_ids: List[int]) -> int:
+        """Delete several items with a single statement; returns the number deleted."""
+        try:
+            self.logger.debug(f"Deleting items: {item_ids}")
+
+            if self.use_mock:
+                # Mock implementation
+                deleted = sum(
+                    _items_storage.pop(item_id, None) is not None for item_id in item_ids
+                )
+                self.logger.info(f"Deleted {deleted} items")
+                return deleted
+
+            stmt = delete(Item).where(Item.id.in_(item_ids))
+            if self.session:
+                result = await self.session.execute(stmt)
+                await self.session.commit()
+            else:
+                async with db_manager.get_session() as session:
+                    result = await session.execute(stmt)
+                    await session.commit()
+
+            self.logger.info(f"Deleted {result.rowcount} items")
+            return result.rowcount
+
+        except SQLAlchemyError as e:
+            self.logger.error(f"Database error deleting items: {e}")
+            raise
+        except Exception as e:
+            self.logger.error(f"Error deleting items: {e}")
+            raise
+
+    @staticmethod
+    def _search_statements(query: str, pagination: PaginationParams) -> Tuple[Select, Select]:
+        """Build the count and page queries for search(); ix_items_name_trgm serves both."""
+        condition = func.lower(Item.name).like(f"%{query.lower()}%")
+        count_stmt = select(func.count(Item.id)).where(condition)
+        query_stmt = (
+            select(Item)
+            .where(condition)
+            .order_by(Item.created_at.desc())
+            .offset(pagination.offset)
+            .limit(pagination.limit)
+        )
+        return count_stmt, query_stmt
+
     async def search(
         self, query: str, pagination: Optional[PaginationParams] = None
     ) -> PaginatedResponse:
@@ -373,40 +495,18 @@ class ItemRepository(BaseRepository):
                     limit=pagination.limit,
                 )
 
-            search_query = f"%{query.lower()}%"
+            count_stmt, query_stmt = self._search_statements(query, pagination)
             if self.session:
-                count_result = await self.session.execute(
-                    select(func.count(Item.id)).where(
-                        func.lower(Item.name).like(search_query)
-                    )
-                )
+                count_result = await self.session.execute(count_stmt)
                 total = count_result.scalar()
 
-                query_stmt = (
-                    select(Item)
-                    .where(func.lower(Item.name).like(search_query))
-                    .order_by(Item.created_at.desc())
-                    .offset(pagination.offset)
-                    .limit(pagination.limit)
-                )
                 result = await self.session.execute(query_stmt)
                 items = result.scalars().all()
             else:
                 async with db_manager.get_session() as session:
-                    count_result = await session.execute(
-                        select(func.count(Item.id)).where(
-                            func.lower(Item.name).like(search_query)
-                        )
-                    )
+                    count_result = await session.execute(count_stmt)
                     total = count_result.scalar()
 
-                    query_stmt = (
-                        select(Item)
-                        .where(func.lower(Item.name).like(search_query))
-                        .order_by(Item.created_at.desc())
-                        .offset(pagination.offset)
-                        .limit(pagination.limit)
-                    )
                     result = await session.execute(query_stmt)
                     items = result.scalars().all()
 
@@ -2,7 +2,7 @@
 from datetime import datetime, timezone
 from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, insert, update, delete, exists
 from sqlalchemy.orm import selectinload
 
 from app.models.entities import PasskeyCredential, User
@@ -32,16 +32,50 @@ class PasskeyCredentialRepository:
         await self.db.refresh(db_credential)
         return db_credential
     
-    async def get_by_credential_id(self, credential_id: str) -> Optional[PasskeyCredential]:
-        """Get passkey credential by credential ID."""
-        result = await self.db.execute(
+    async def bulk_create(self, user_id: int, credentials_data: List[PasskeyCredentialCreate]) -> List[PasskeyCredential]:
+        """Create several passkey credentials with a single multi-row INSERT."""
+        created_at = datetime.now(timezone.utc)
+        rows = [
+            {
+                "user_id": user_id,
+                "credential_id": credential_data.credential_id,
+                "public_key": credential_data.public_key,
+                "sign_count": credential_data.sign_count,
+                "name": credential_data.name,
+                "created_at": created_at,
+                "is_active": True,
+            }
+            for credential_data in credentials_data
+        ]
+        
+        result = await self.db.scalars(insert(PasskeyCredential).returning(PasskeyCredential), rows)
+        db_credentials = result.all()
+        await self.db.commit()
+        return list(db_credentials)
+    
+    async def get_by_credential_id(self, credential_id: str, load_user: bool = False) -> Optional[PasskeyCredential]:
+        """Get passkey credential by credential ID, eagerly loading its user if asked."""
+        query = (
             select(PasskeyCredential)
-            .options(selectinload(PasskeyCredential.user))
             .where(PasskeyCredential.credential_id == credential_id)
             .where(PasskeyCredential.is_active == True)
         )
+        if load_user:
+            query = query.options(selectinload(PasskeyCredential.user))
+        
+        result = await self.db.execute(query)
         return result.scalar_one_or_none()
     
+    async def exists_active(self, credential_id: str) -> bool:
+        """Check whether an active credential with this ID exists, without loading it."""
+        return await self.db.scalar(
+            select(
+                exists()
+                .where(PasskeyCredential.credential_id == credential_id)
+                .where(PasskeyCredential.is_active == True)
+            )
+        )
+    
     async def get_by_user_id(self, user_id: int) -> List[PasskeyCredential]:
         """Get all active passkey credentials for a user."""
         result = await self.db.execute(
@@ -86,9 +120,9 @@ class PasskeyCredentialRepository:
     
     async def get_credential_ids_for_user(self, user_id: int) -> List[str]:
         """Get all credential IDs for a user (for exclusion in registration)."""
-        result = await self.db.execute(
+        result = await self.db.scalars(
             select(PasskeyCredential.credential_id)
             .where(PasskeyCredential.user_id == user_id)
             .where(PasskeyCredential.is_active == True)
         )
-        return [row[0] for row in result.fetchall()]
\ No newline at end of file
+        return list(result)
\ No newline at end of file
@@ -1,56 +1,277 @@
 """Shared test configuration and fixtures."""
 import asyncio
+import logging
+import os
 import pytest
 import pytest_asyncio
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker, Session
+from pytest_asyncio import is_async_test
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateIndex, CreateTable
+from httpx import ASGITransport, AsyncClient
 from app.models.entities import Base
-from app.repositories.user_repository import UserRepository
 from app.auth.models import UserCreate
 
+logger = logging.getLogger(__name__)
+
 
 # Use in-memory SQLite for testing
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
-SYNC_TEST_DATABASE_URL = "sqlite:///:memory:"
 
+# Every run gets its own schema in the shared test database: one per
+# pytest-xdist worker, or test_main without xdist. Tables are only ever
+# created in it and it is dropped wholesale, so nothing in public (or in
+# another worker's schema) is touched. Extensions live in public, which stays
+# on the search path.
+TEST_SCHEMA = f"test_{os.environ.get('PYTEST_XDIST_WORKER', 'main')}"
+
+# PostgreSQL schema DDL, compiled once at import. The test suite owns the
+# schema, so there is no need for create_all()'s per-table catalog checks;
+# unqualified names resolve to TEST_SCHEMA, first on the search path.
+_PG_DIALECT = postgresql.asyncpg.dialect()
+POSTGRES_DROP_DDL = [f"DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE"]
+POSTGRES_CREATE_DDL = [
+    f"CREATE SCHEMA {TEST_SCHEMA}",
+    # Required by the model's ix_items_name_trgm, as in the matching migration
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public",
+] + [
+    str(ddl.compile(dialect=_PG_DIALECT))
+    for table in Base.metadata.sorted_tables
+    for ddl in [CreateTable(table)] + [CreateIndex(index) for index in table.indexes]
+]
+
+
+# PostgreSQL test database settings. Applied in pytest_configure, before any
+# test module imports app.config, so every module sees the same values.
+TEST_DATABASE_ENV = {
+    # Mock storage by default; PostgreSQL fixtures opt out per test/session
+    "USE_MOCK_DB": "true",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5433",
+    "DB_NAME": "fastapi_test_db",
+    "DB_USER": "postgres",
+    "DB_PASSWORD": "password",
+    # Small fixed pool per process, warmed up front and never pinged or
+    # recycled; short test queries gain nothing from JIT
+    "DB_POOL_SIZE": "5",
+    "DB_MAX_OVERFLOW": "0",
+    "DB_POOL_RECYCLE": "-1",
+    "DB_POOL_PRE_PING": "false",
+    "DB_JIT": "false",
+    "DB_SEARCH_PATH": f"{TEST_SCHEMA}, public",
+}
+
+
+def pytest_configure(config):
+    """Set the test database environment once per run."""
+    for name, value in TEST_DATABASE_ENV.items():
+        os.environ.setdefault(name, value)
+
+
+def pytest_collection_modifyitems(items):
+    """
+    Run every async test on the shared session-scoped event loop, and skip
+    PostgreSQL tests up front when the database is unavailable.
+    """
+    session_loop = pytest.mark.asyncio(loop_scope="session")
+    for item in items:
+        if is_async_test(item):
+            item.add_marker(session_loop, append=False)
+    
+    postgres_items = [item for item in items if item.get_closest_marker("postgres")]
+    if postgres_items and not asyncio.run(check_database_availability()):
+        skip = pytest.mark.skip(reason="PostgreSQL database not available")
+        for item in postgres_items:
+            item.add_marker(skip)
 
 
 @pytest.fixture(scope="session")
-def sync_test_engine():
-    """Create synchronous test database engine for FastAPI TestClient."""
-    engine = create_engine(
-        SYNC_TEST_DATABASE_URL,
-        poolclass=StaticPool,
-        connect_args={"check_same_thread": False},
-        echo=False
-    )
+def event_loop_policy():
+    """Use uvloop for the test event loop when it is installed."""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.DefaultEventLoopPolicy()
+    return uvloop.EventLoopPolicy()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fast_password_hashing():
+    """
+    Hash test passwords at bcrypt's minimum cost.
+
+    The default 12 rounds take ~0.3s per hash and dominate the runtime of
+    every test that creates a user; 4 rounds is ~256x cheaper.
+    """
+    from app.auth.security import pwd_context
     
-    # Create all tables
-    Base.metadata.create_all(bind=engine)
+    settings = pwd_context.to_dict()
+    pwd_context.update(bcrypt__rounds=4)
+    yield
+    pwd_context.load(settings)
+
+
+# Cached result of the PostgreSQL probe; ``None`` until the first check
+_database_available = None
+
+
+async def check_database_availability():
+    """
+    Check if PostgreSQL test database is available.
+
+    Performs a full asyncpg handshake against the same DSN the engine uses, so
+    a missing database or bad credentials are caught here rather than later in
+    ``db_manager.initialize()``. The result is cached for the session.
+    """
+    global _database_available
+    if _database_available is None:
+        import asyncpg
+        from app.config import config
+        
+        try:
+            conn = await asyncpg.connect(config.database.sync_url, timeout=1.0)
+            await conn.close()
+            _database_available = True
+        except Exception:
+            _database_available = False
+    return _database_available
+
+
+
+def _enable_sqlite_savepoints(engine):
+    """
+    Let SQLAlchemy emit SQLite's BEGIN itself so SAVEPOINTs nest properly.
+
+    pysqlite defers BEGIN until the first DML statement, so a SAVEPOINT issued
+    first would open the outer transaction and its RELEASE would commit it.
+    """
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
     
-    yield engine
+    @event.listens_for(engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def postgres_database():
+    """
+    Initialize the PostgreSQL test database once per session.
+
+    The schema is created once and dropped at the end of the run; tests that
+    need a clean slate roll back their changes via ``postgres_transaction``.
+    """
+    if not await check_database_availability():
+        pytest.skip("PostgreSQL database not available - skipping direct database tests")
     
-    # Drop all tables after tests
-    Base.metadata.drop_all(bind=engine)
+    from app.models.database import db_manager
+    
+    try:
+        # Only engine creation needs the real backend selected. Tests that
+        # route requests or repositories to PostgreSQL opt in with their own
+        # USE_MOCK_DB override, so the rest of the session keeps mock storage.
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setenv("USE_MOCK_DB", "false")
+            await db_manager.initialize()
+        
+        # Recreate this run's schema, dropping whatever a crashed run left
+        async with db_manager.engine.begin() as conn:
+            for ddl in POSTGRES_DROP_DDL + POSTGRES_CREATE_DDL:
+                await conn.execute(text(ddl))
+        
+        # Open the whole pool now so tests don't pay for asyncpg's
+        # connection setup and type introspection on first use
+        async def warm():
+            async with db_manager.engine.connect() as conn:
+                await conn.exec_driver_sql("SELECT 1")
+        
+        async with asyncio.TaskGroup() as tg:
+            for _ in range(db_manager.engine.pool.size()):
+                tg.create_task(warm())
+        logger.debug("Test pool ready: %s", db_manager.engine.pool.status())
+    except Exception as e:
+        pytest.skip(f"Database setup failed: {e}")
+    
+    yield db_manager
+    
+    # Clean up
+    try:
+        async with db_manager.engine.begin() as conn:
+            for ddl in POSTGRES_DROP_DDL:
+                await conn.execute(text(ddl))
+        await db_manager.close()
+    except Exception:
+        pass  # Ignore cleanup errors
 
 
-@pytest.fixture
-def sync_db_session(sync_test_engine):
-    """Create a synchronous test database session for FastAPI TestClient."""
-    from sqlalchemy.orm import sessionmaker
-    Session = sessionmaker(bind=sync_test_engine)
-    session = Session()
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def postgres_connection(postgres_database):
+    """Single connection shared by tests that roll back their changes."""
+    async with postgres_database.engine.connect() as conn:
+        yield conn
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def postgres_transaction(postgres_database, postgres_connection):
+    """
+    Run the test inside a transaction that is rolled back afterwards.
+
+    Sessions handed out by ``db_manager`` join the transaction through
+    savepoints, so repository commits only release a savepoint and nothing
+    is left behind for the next test to clean up.
+    """
+    transaction = await postgres_connection.begin()
+    session_factory = postgres_database.session_factory
+    postgres_database.session_factory = async_sessionmaker(
+        bind=postgres_connection,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        join_transaction_mode="create_savepoint",
+    )
     
     try:
-        yield session
+        yield postgres_connection
     finally:
-        session.close()
-        # Clean up all data after each test
-        for table in reversed(Base.metadata.sorted_tables):
-            session.execute(table.delete())
-        session.commit()
+        postgres_database.session_factory = session_factory
+        await transaction.rollback()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def postgres_pool(postgres_database):
+    """
+    Raw asyncpg pool for tests that bypass the ORM.
+
+    Uses the same database as ``db_manager`` so smoke checks skip SQLAlchemy's
+    statement compilation and result materialization.
+    """
+    import asyncpg
+    from app.config import config
+    
+    server_settings = {"search_path": config.database.search_path} if config.database.search_path else None
+    pool = await asyncpg.create_pool(
+        config.database.sync_url, min_size=2, max_size=10, server_settings=server_settings
+    )
+    
+    yield pool
+    
+    await pool.close()
+
+
+@pytest_asyncio.fixture(scope="session")
+async def async_client():
+    """
+    HTTP client that drives the app on the session event loop and engine pool.
+
+    Shared by every test, so per-request state such as auth headers is passed
+    on each call rather than set on the client.
+    """
+    from app.main import app
+    
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
 
 
 @pytest_asyncio.fixture(scope="session")
@@ -62,6 +283,7 @@ async def test_engine():
         connect_args={"check_same_thread": False},
         echo=False
     )
+    _enable_sqlite_savepoints(engine.sync_engine)
     
     # Create all tables
     async with engine.begin() as conn:
@@ -76,34 +298,69 @@ async def test_engine():
     await engine.dispose()
 
 
-@pytest_asyncio.fixture
-async def db_session(test_engine):
-    """Create a test database session with proper cleanup."""
-    async_session_maker = sessionmaker(
-        test_engine, class_=AsyncSession, expire_on_commit=False
-    )
-    
-    async with async_session_maker() as session:
+@pytest_asyncio.fixture(scope="module")
+async def db_connection(test_engine):
+    """
+    Test database connection whose outer transaction spans the module.
+
+    Module-scoped rows, like ``test_user``, are created on it once and
+    discarded with everything else when the module finishes.
+    """
+    async with test_engine.connect() as conn:
+        transaction = await conn.begin()
         try:
-            yield session
+            yield conn
         finally:
-            # Clean up all data after each test to ensure isolation
-            await session.rollback()
-            # Delete all data from all tables
-            for table in reversed(Base.metadata.sorted_tables):
-                await session.execute(table.delete())
-            await session.commit()
+            await transaction.rollback()
 
 
 @pytest_asyncio.fixture
-async def test_user(db_session: AsyncSession):
-    """Create a test user."""
-    user_repo = UserRepository(db_session)
-    user_data = UserCreate(
-        email="testuser@example.com",
-        username="testuser",
-        password="testpassword123"
+async def db_session(db_connection):
+    """
+    Create a test database session rolled back after each test.
+
+    The session lives in a per-test savepoint on the module connection;
+    commits made by the code under test only release nested savepoints, so
+    nothing needs deleting afterwards.
+    """
+    savepoint = await db_connection.begin_nested()
+    session = AsyncSession(
+        bind=db_connection, expire_on_commit=False, join_transaction_mode="create_savepoint"
     )
-    user = await user_repo.create(user_data)
-    await db_session.commit()
-    return user
\ No newline at end of file
+    try:
+        yield session
+    finally:
+        await session.close()
+        await savepoint.rollback()
+
+
+@pytest_asyncio.fixture(scope="module")
+async def test_user(db_connection):
+    """
+    Create a test user once per module.
+
+    Being module-scoped, it is set up before any test's ``db_session``
+    savepoint, so the per-test rollback leaves it in place.
+    """
+    from app.repositories.user_repository import UserRepository
+    
+    async with AsyncSession(
+        bind=db_connection, expire_on_commit=False, join_transaction_mode="create_savepoint"
+    ) as session:
+        user_repo = UserRepository(session)
+        user_data = UserCreate(
+            email="testuser@example.com",
+            username="testuser",
+            password="testpassword123"
+        )
+        user = await user_repo.create(user_data)
+        await session.commit()
+    return user
+
+
+@pytest.fixture
+def passkey_repo(db_session):
+    """Passkey repository on the test's ``db_session``."""
+    from app.repositories.passkey_repository import PasskeyCredentialRepository
+    
+    return PasskeyCredentialRepository(db_session)
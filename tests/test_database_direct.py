@@ -1,115 +1,131 @@
 """
 Simplified integration tests for PostgreSQL connectivity.
 Tests database operations directly without FastAPI TestClient to avoid event loop conflicts.
+Repository tests run against both the mock store and PostgreSQL.
 """
-import os
+import json
+import logging
 import pytest
 import asyncio
-import httpx
-from contextlib import asynccontextmanager
-import sys
-import socket
-
-# Add parent directory to path to import from app
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-# Set environment variables for real database testing
-os.environ["USE_MOCK_DB"] = "false"
-os.environ["DB_HOST"] = "localhost"
-os.environ["DB_PORT"] = "5433"
-os.environ["DB_NAME"] = "fastapi_test_db"
-os.environ["DB_USER"] = "postgres"
-os.environ["DB_PASSWORD"] = "password"
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.database import db_manager
-from app.models.entities import Base, Item
+from app.models.entities import Item, reset_storage
 from app.repositories.item_repository import ItemRepository
 from app.models.schemas import ItemCreate, ItemUpdate, PaginationParams
-from sqlalchemy import text, select
 
+logger = logging.getLogger(__name__)
 
-def check_database_availability():
-    """Check if PostgreSQL test database is available."""
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(1)
-        result = sock.connect_ex(('localhost', 5433))
-        sock.close()
-        return result == 0
-    except Exception:
-        return False
-
-
-@pytest.fixture(scope="module", autouse=True)
-async def setup_test_database():
-    """Setup and teardown test database."""
-    if not check_database_availability():
-        pytest.skip("PostgreSQL database not available - skipping direct database tests")
-    
-    try:
-        await db_manager.initialize()
-        
-        # Create tables
-        async with db_manager.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        
-        yield
-        
-    except Exception as e:
-        pytest.skip(f"Database setup failed: {e}")
-    finally:
-        # Clean up
-        try:
-            if db_manager.engine:
-                async with db_manager.engine.begin() as conn:
-                    await conn.run_sync(Base.metadata.drop_all)
-                await db_manager.close()
-        except Exception:
-            pass  # Ignore cleanup errors
+_PG_DIALECT = postgresql.asyncpg.dialect()
+
+
+@pytest.fixture(scope="module")
+def backend(request):
+    """Point the repository layer at the mock store or PostgreSQL."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("USE_MOCK_DB", "true" if request.param == "mock" else "false")
+        if request.param == "postgres":
+            # Skips every postgres-backed test when the database is unavailable
+            request.getfixturevalue("postgres_database")
+        yield request.param
+
+
+@pytest.fixture(scope="module")
+def repo(backend):
+    """Shared repository; each call opens its own session via ``db_manager``."""
+    return ItemRepository()
+
+
+@pytest.fixture
+def pool(request, backend):
+    """Raw asyncpg pool for PostgreSQL checks; ``None`` for the mock backend."""
+    if backend == "mock":
+        return None
+    return request.getfixturevalue("postgres_pool")
 
 
 @pytest.fixture(autouse=True)
-async def clean_database():
-    """Clean database before each test."""
-    if db_manager.engine and db_manager.is_connected:
-        try:
-            async with db_manager.engine.begin() as conn:
-                await conn.execute(text("TRUNCATE TABLE items RESTART IDENTITY CASCADE"))
-        except Exception as e:
-            print(f"Failed to clean database: {e}")
-
-
-@pytest.mark.asyncio
-async def test_database_connection():
+def clean_database(request, backend):
+    """Isolate each test from the data written by the others."""
+    if backend == "mock":
+        reset_storage()
+    else:
+        # Everything the test writes through db_manager is rolled back
+        request.getfixturevalue("postgres_transaction")
+
+
+# asyncpg caches the prepared statement per pooled connection
+_INSERT_ITEM_SQL = """
+    INSERT INTO items (name, price, is_offer, created_at, updated_at)
+    VALUES ($1, $2, $3, now(), now())
+    RETURNING id
+"""
+
+# Seed data is trusted and shared across runs, so skip validation once here
+_SEARCH_ITEMS = [
+    ItemCreate.model_construct(name=name, price=price, is_offer=False)
+    for name, price in (
+        ("Apple iPhone", 999.99),
+        ("Samsung Galaxy", 899.99),
+        ("Apple MacBook", 1299.99),
+    )
+]
+_PAGINATION_ITEMS = [
+    ItemCreate.model_construct(name=f"Item {i}", price=float(i * 10), is_offer=False)
+    for i in range(10)
+]
+
+
+async def _seed_items(repo, items):
+    """Load precondition rows; PostgreSQL gets a single COPY, bypassing the ORM."""
+    if repo.use_mock:
+        await repo.bulk_create(items)
+        return
+    
+    now = datetime.now()
+    async with db_manager.get_session() as session:
+        # COPY on the session's own connection so the rows join the test transaction
+        conn = await session.connection()
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            "items",
+            records=[(item.name, item.price, item.is_offer, now, now) for item in items],
+            columns=("name", "price", "is_offer", "created_at", "updated_at"),
+        )
+
+
+def _walk_plan(node):
+    """Yield every node of an EXPLAIN (FORMAT JSON) plan tree."""
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk_plan(child)
+
+
+async def _check_connection(repo, pool):
     """Test basic database connectivity."""
     # Test database connection
-    async with db_manager.get_session() as session:
-        result = await session.execute(text("SELECT 1 as test"))
-        assert result.scalar() == 1
+    async with pool.acquire() as conn:
+        assert await conn.fetchval("SELECT 1 as test") == 1
     
-    print("✓ Database connection test passed")
+    logger.debug("✓ Database connection test passed")
 
 
-@pytest.mark.asyncio
-async def test_table_creation():
+async def _check_tables(repo, pool):
     """Test that tables are created properly."""
-    async with db_manager.get_session() as session:
+    async with pool.acquire() as conn:
         # Check if items table exists
-        result = await session.execute(text("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'items'
-            );
-        """))
-        assert result.scalar() is True
+        exists = await conn.fetchval("SELECT to_regclass('items') IS NOT NULL")
+        assert exists is True
     
-    print("✓ Table creation test passed")
+    logger.debug("✓ Table creation test passed")
 
 
-@pytest.mark.asyncio
-async def test_item_repository_crud():
+async def _check_crud(repo, pool):
     """Test CRUD operations with ItemRepository."""
+    # Run the whole sequence on one session: a single pool checkout
     async with db_manager.get_session() as session:
         repo = ItemRepository(session)
         
@@ -140,67 +156,138 @@ async def test_item_repository_crud():
         deleted_item = await repo.get(created_item.id)
         assert deleted_item is None
     
-    print("✓ CRUD operations test passed")
+    logger.debug("✓ CRUD operations test passed")
 
 
-@pytest.mark.asyncio
-async def test_search_functionality():
+async def _check_search(repo, pool):
     """Test search functionality."""
-    async with db_manager.get_session() as session:
-        repo = ItemRepository(session)
-        
-        # Create test items
-        await repo.create(ItemCreate(name="Apple iPhone", price=999.99))
-        await repo.create(ItemCreate(name="Samsung Galaxy", price=899.99))
-        await repo.create(ItemCreate(name="Apple MacBook", price=1299.99))
-        
-        # Test search
-        search_results = await repo.search("Apple")
-        assert len(search_results.items) == 2
-        assert search_results.total == 2
-        assert all("Apple" in item.name for item in search_results.items)
+    # Create test items
+    await repo.bulk_create(_SEARCH_ITEMS)
+    
+    # Test search
+    search_results = await repo.search("Apple")
+    assert len(search_results.items) == 2
+    assert search_results.total == 2
+    assert all("Apple" in item.name for item in search_results.items)
     
-    print("✓ Search functionality test passed")
+    if pool is not None:
+        # Guard against losing the trigram index. With only bitmap scans
+        # allowed, the btree indexes have nothing to offer a '%...%' match, so
+        # the repository's own queries can only avoid a sequential scan
+        # through ix_items_name_trgm.
+        async with pool.acquire() as conn, conn.transaction():
+            for setting in ("enable_seqscan", "enable_indexscan", "enable_indexonlyscan"):
+                await conn.execute(f"SET LOCAL {setting} = off")
+            for stmt in ItemRepository._search_statements("Apple", PaginationParams()):
+                sql = stmt.compile(dialect=_PG_DIALECT, compile_kwargs={"literal_binds": True})
+                plan = json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}"))
+                assert any(
+                    node.get("Index Name") == "ix_items_name_trgm"
+                    for node in _walk_plan(plan[0]["Plan"])
+                )
+    
+    logger.debug("✓ Search functionality test passed")
 
 
-@pytest.mark.asyncio
-async def test_pagination():
+async def _check_pagination(repo, pool):
     """Test pagination functionality."""
-    async with db_manager.get_session() as session:
-        repo = ItemRepository(session)
-        
-        # Create multiple items
-        for i in range(10):
-            await repo.create(ItemCreate(name=f"Item {i}", price=float(i * 10)))
-        
-        # Test pagination
-        page1 = await repo.get_all(PaginationParams(page=1, limit=5))
-        assert len(page1.items) == 5
-        assert page1.total == 10
-        assert page1.page == 1
-        assert page1.pages == 2
-        
-        page2 = await repo.get_all(PaginationParams(page=2, limit=5))
-        assert len(page2.items) == 5
-        assert page2.page == 2
+    # Create multiple items
+    await _seed_items(repo, _PAGINATION_ITEMS)
+    
+    # Test pagination
+    page1 = await repo.get_all(PaginationParams(page=1, limit=5))
+    assert len(page1.items) == 5
+    assert page1.total == 10
+    assert page1.page == 1
+    assert page1.pages == 2
     
-    print("✓ Pagination test passed")
+    # Later pages seek by primary key instead of scanning OFFSET rows
+    first = await repo.get_all_keyset(None, 5)
+    second = await repo.get_all_keyset(first[-1].id, 5)
+    assert len(first) == 5
+    assert len(second) == 5
+    assert first[-1].id < second[0].id
+    assert await repo.get_all_keyset(second[-1].id, 5) == []
+    
+    logger.debug("✓ Pagination test passed")
 
 
-@pytest.mark.asyncio
-async def test_concurrent_operations():
-    """Test concurrent database operations."""
-    import asyncio
+async def _check_concurrent(repo, pool):
+    """Test concurrent creates through ItemRepository."""
+    created_ids = []
     
-    async def create_item(session, index):
-        repo = ItemRepository(session)
-        return await repo.create(ItemCreate(name=f"Concurrent Item {index}", price=float(index)))
+    async def create_item(index):
+        item_data = ItemCreate(name=f"Concurrent Item {index}", price=float(index))
+        if repo.use_mock:
+            item = await repo.create(item_data)
+        else:
+            # A session per task checks out its own pooled connection, so the
+            # inserts really overlap; they commit outside the test transaction
+            async with AsyncSession(db_manager.engine, expire_on_commit=False) as session:
+                item = await ItemRepository(session).create(item_data)
+        created_ids.append(item.id)
     
-    # Create multiple items concurrently
-    async with db_manager.get_session() as session:
-        tasks = [create_item(session, i) for i in range(5)]
-        results = await asyncio.gather(*tasks)
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for i in range(5):
+                tg.create_task(create_item(i))
         
-        assert len(results) == 5
-        assert all(item.id is not None for item in results)
+        assert len(created_ids) == 5
+        assert all(item_id is not None for item_id in created_ids)
+        assert len(set(created_ids)) == 5
+    finally:
+        if pool is not None and created_ids:
+            await pool.execute("DELETE FROM items WHERE id = ANY($1::int[])", created_ids)
+
+
+async def _check_concurrent_pool(repo, pool):
+    """Test concurrent inserts on separate raw pool connections."""
+    results = []
+    
+    async def create_item(index):
+        # Each task checks out its own connection so the inserts run in parallel
+        async with pool.acquire() as conn:
+            results.append(
+                await conn.fetchval(_INSERT_ITEM_SQL, f"Concurrent Item {index}", float(index), False)
+            )
     
+    try:
+        # Create multiple items concurrently
+        async with asyncio.TaskGroup() as tg:
+            for i in range(5):
+                tg.create_task(create_item(i))
+        
+        assert len(results) == 5
+        assert all(item_id is not None for item_id in results)
+        assert len(set(results)) == 5
+    finally:
+        # Pool connections commit outside the per-test transaction
+        await pool.execute("DELETE FROM items WHERE id = ANY($1::int[])", results)
+
+
+# Each case runs against the backends it applies to. Raw-connection checks
+# only make sense against PostgreSQL; repository checks run against both.
+CASES = {
+    "connection": (_check_connection, ["postgres"]),
+    "tables": (_check_tables, ["postgres"]),
+    "crud": (_check_crud, ["mock", "postgres"]),
+    "search": (_check_search, ["mock", "postgres"]),
+    "pagination": (_check_pagination, ["mock", "postgres"]),
+    "concurrent": (_check_concurrent, ["mock", "postgres"]),
+    "concurrent_pool": (_check_concurrent_pool, ["postgres"]),
+}
+
+
+@pytest.mark.parametrize(
+    ("case", "backend"),
+    [
+        pytest.param(case, backend, marks=[pytest.mark.postgres] if backend == "postgres" else [])
+        for case, (_, backends) in CASES.items()
+        for backend in backends
+    ],
+    indirect=["backend"],
+)
+async def test_db(case, backend, repo, pool):
+    """Run one database case against one storage backend."""
+    check, _ = CASES[case]
+    await check(repo, pool)
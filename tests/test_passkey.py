@@ -1,223 +1,346 @@
 """Tests for passkey authentication functionality."""
 import base64
-import json
-from datetime import datetime, timedelta
-from unittest.mock import patch, MagicMock
+import contextlib
+import hashlib
+import secrets
+import struct
 
+import cbor2
+import orjson
 import pytest
 import pytest_asyncio
-from fastapi.testclient import TestClient
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
 
 from app.main import app
+from app.api.passkey import begin_passkey_authentication
 from app.models.database import get_db_session
-from app.repositories.user_repository import UserRepository
 from app.repositories.passkey_repository import PasskeyCredentialRepository
-from app.auth.models import UserCreate
+from app.auth.security import create_access_token
 from app.auth.webauthn_service import webauthn_service
-from app.auth.passkey_models import PasskeyCredentialCreate
+from app.auth.passkey_models import PasskeyAuthenticationRequest, PasskeyCredentialCreate
 
 
-# Use mock database for passkey tests to avoid DB connection issues
-import os
-os.environ["USE_MOCK_DB"] = "true"
+def _b64u(data: bytes) -> str:
+    """Encode bytes as unpadded base64url, as browsers do."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
 
-client = TestClient(app)
 
+class VirtualAuthenticator:
+    """
+    Software platform authenticator that signs real WebAuthn challenges.
 
-@pytest_asyncio.fixture
-async def async_test_user(db_session: AsyncSession):
-    """Create a test user using async session."""
-    user_repo = UserRepository(db_session)
-    user_data = UserCreate(
-        email="testuser@example.com",
-        username="testuser",
-        password="testpassword123"
-    )
-    user = await user_repo.create(user_data)
-    await db_session.commit()
-    return user
+    Holds a single ES256 (P-256) credential; ``create`` and ``get`` turn the
+    options returned by the ``begin`` endpoints into bodies ready to POST to
+    the matching ``complete`` endpoints.
+    """
+
+    origin = "http://localhost:8000"
+
+    def __init__(self):
+        self.private_key = ec.generate_private_key(ec.SECP256R1())
+        self.credential_id = secrets.token_bytes(16)
+        self.sign_count = 0
+
+    def _client_data(self, ceremony: str, challenge: str) -> bytes:
+        return orjson.dumps({"type": ceremony, "challenge": challenge, "origin": self.origin})
+
+    def _authenticator_data(self, rp_id: str, flags: int, attested: bytes = b"") -> bytes:
+        rp_id_hash = hashlib.sha256(rp_id.encode()).digest()
+        return rp_id_hash + bytes([flags]) + struct.pack(">I", self.sign_count) + attested
+
+    @property
+    def id(self) -> str:
+        """Credential ID as the server stores it."""
+        return _b64u(self.credential_id)
+
+    @property
+    def public_key(self) -> bytes:
+        """COSE-encoded public key, as carried in the attestation."""
+        numbers = self.private_key.public_key().public_numbers()
+        return cbor2.dumps({
+            1: 2,  # kty: EC2
+            3: -7,  # alg: ES256
+            -1: 1,  # crv: P-256
+            -2: numbers.x.to_bytes(32, "big"),
+            -3: numbers.y.to_bytes(32, "big"),
+        })
+
+    def create(self, options: dict) -> dict:
+        """Answer registration options with a ``none`` attestation."""
+        attested = (
+            bytes(16)  # AAGUID
+            + struct.pack(">H", len(self.credential_id))
+            + self.credential_id
+            + self.public_key
+        )
+        # UP | UV | AT
+        auth_data = self._authenticator_data(options["rp"]["id"], 0x45, attested)
+        attestation = cbor2.dumps({"fmt": "none", "attStmt": {}, "authData": auth_data})
+        client_data = self._client_data("webauthn.create", options["challenge"])
+        return {
+            "id": self.id,
+            "rawId": self.id,
+            "type": "public-key",
+            "response": {
+                "clientDataJSON": _b64u(client_data),
+                "attestationObject": _b64u(attestation),
+            },
+        }
+
+    def get(self, options: dict) -> dict:
+        """Answer authentication options with a signed assertion."""
+        self.sign_count += 1
+        # UP | UV
+        auth_data = self._authenticator_data(options["rpId"], 0x05)
+        client_data = self._client_data("webauthn.get", options["challenge"])
+        signature = self.private_key.sign(
+            auth_data + hashlib.sha256(client_data).digest(), ec.ECDSA(hashes.SHA256())
+        )
+        return {
+            "id": self.id,
+            "rawId": self.id,
+            "type": "public-key",
+            "response": {
+                "authenticatorData": _b64u(auth_data),
+                "clientDataJSON": _b64u(client_data),
+                "signature": _b64u(signature),
+            },
+        }
+
+
+@pytest.fixture(scope="session")
+def virtual_authenticator():
+    """One software authenticator shared by the whole run."""
+    return VirtualAuthenticator()
+
+
+_MISSING = object()
+
+
+@contextlib.contextmanager
+def override(dependency, impl):
+    """
+    Override one app dependency, restoring only that key on exit.
+
+    Whatever the key held before (or its absence) comes back afterwards, so
+    overrides installed elsewhere are left alone.
+    """
+    overrides = app.dependency_overrides
+    previous = overrides.get(dependency, _MISSING)
+    overrides[dependency] = impl
+    try:
+        yield
+    finally:
+        if previous is _MISSING:
+            overrides.pop(dependency, None)
+        else:
+            overrides[dependency] = previous
+
+
+@pytest.fixture(autouse=True)
+def override_db_session(db_session):
+    """Serve ``db_session`` to the endpoints under test, undoing it afterwards."""
+    with override(get_db_session, lambda: db_session):
+        yield db_session
+
+
+@pytest_asyncio.fixture(scope="module")
+async def registered_authenticator(db_connection, test_user):
+    """
+    Authenticator whose credential is stored for ``test_user`` once.
+
+    It is separate from ``virtual_authenticator`` so registration tests can
+    still enrol that one without clashing on the credential ID.
+    """
+    authenticator = VirtualAuthenticator()
+    async with AsyncSession(
+        bind=db_connection, expire_on_commit=False, join_transaction_mode="create_savepoint"
+    ) as session:
+        await PasskeyCredentialRepository(session).create(
+            test_user.id,
+            PasskeyCredentialCreate(
+                credential_id=authenticator.id,
+                public_key=authenticator.public_key,
+                sign_count=authenticator.sign_count,
+            ),
+        )
+    return authenticator
 
 
 @pytest.fixture
-def mock_webauthn_service():
-    """Mock WebAuthn service for testing."""
-    with patch('app.api.passkey.webauthn_service') as mock:
-        yield mock
+def seeded_challenge(test_user):
+    """Challenge stored for ``test_user`` without a ``begin`` request."""
+    challenge = webauthn_service.generate_challenge()
+    webauthn_service.store_challenge(test_user.id, challenge)
+    yield challenge
+    webauthn_service.clear_challenge(test_user.id)
+
+
+@pytest.fixture(scope="module")
+def auth_headers(test_user):
+    """Bearer token headers for ``test_user``, signed once per module."""
+    token = create_access_token(data={"sub": test_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest_asyncio.fixture
+async def stored_credentials(passkey_repo, test_user):
+    """Two passkeys for ``test_user``, inserted in one statement."""
+    return await passkey_repo.bulk_create(
+        test_user.id,
+        [
+            PasskeyCredentialCreate(
+                credential_id=f"stored_credential_{i}", public_key=b"public_key", name=f"Key {i}"
+            )
+            for i in range(2)
+        ],
+    )
 
 
 class TestPasskeyRegistration:
     """Test passkey registration endpoints."""
     
-    @pytest.mark.asyncio
-    async def test_begin_passkey_registration_success(self, async_test_user, db_session):
-        """Test beginning passkey registration for valid user."""
-        
-        # Mock database session  
-        def get_test_db():
-            return db_session
-        
-        app.dependency_overrides[get_db_session] = get_test_db
-        
+    @pytest.mark.parametrize(
+        ("username", "status_code", "detail"),
+        [
+            ("testuser", 200, None),
+            ("nonexistent", 404, "User not found"),
+        ],
+        ids=["success", "user_not_found"],
+    )
+    async def test_begin_passkey_registration(
+        self, async_client, test_user, username, status_code, detail
+    ):
+        """Test beginning passkey registration for existing and unknown users."""
         request_data = {
-            "username": async_test_user.username
+            "username": username
         }
         
-        try:
-            response = client.post("/api/v1/passkey/register/begin", json=request_data)
-            
-            assert response.status_code == 200
-            data = response.json()
-            
-            # Check required WebAuthn fields
-            assert "challenge" in data
-            assert "rp" in data
-            assert "user" in data
-            assert "pubKeyCredParams" in data
-            assert data["rp"]["id"] == "localhost"
-            assert data["user"]["name"] == async_test_user.username
-        finally:
-            # Clean up
-            app.dependency_overrides.clear()
-    
-    @pytest.mark.asyncio
-    async def test_begin_passkey_registration_user_not_found(self, db_session):
-        """Test beginning passkey registration for non-existent user."""
-        
-        def get_test_db():
-            return db_session
+        response = await async_client.post("/api/v1/passkey/register/begin", json=request_data)
         
-        app.dependency_overrides[get_db_session] = get_test_db
+        assert response.status_code == status_code
+        data = response.json()
+        if detail is not None:
+            assert detail in data["detail"]
+            return
         
-        request_data = {
-            "username": "nonexistent"
-        }
+        # Check required WebAuthn fields
+        assert {"challenge", "rp", "user", "pubKeyCredParams"} <= data.keys()
+        assert data["rp"]["id"] == "localhost"
+        assert data["user"]["name"] == test_user.username
+    
+    async def test_complete_passkey_registration(
+        self, async_client, auth_headers, virtual_authenticator, seeded_challenge
+    ):
+        """Test completing registration with a real attestation."""
+        credential = virtual_authenticator.create(
+            {"rp": {"id": webauthn_service.rp_id}, "challenge": seeded_challenge}
+        )
+        response = await async_client.post(
+            "/api/v1/passkey/register/complete",
+            json={**credential, "name": "Virtual key"},
+            headers=auth_headers,
+        )
         
-        try:
-            response = client.post("/api/v1/passkey/register/begin", json=request_data)
-            
-            assert response.status_code == 404
-            assert "User not found" in response.json()["detail"]
-        finally:
-            app.dependency_overrides.clear()
+        assert response.status_code == 200
+        data = response.json()
+        assert data["credential_id"] == credential["id"]
+        assert data["name"] == "Virtual key"
 
 
 class TestPasskeyAuthentication:
     """Test passkey authentication endpoints."""
     
-    @pytest.mark.asyncio
     async def test_begin_passkey_authentication_usernameless(self, db_session):
         """Test beginning usernameless passkey authentication."""
+        # Only the response shape is checked, so call the route directly
+        options = await begin_passkey_authentication(PasskeyAuthenticationRequest(), db=db_session)
         
-        def get_test_db():
-            return db_session
-        
-        app.dependency_overrides[get_db_session] = get_test_db
-        
-        # For usernameless authentication, send empty JSON body
-        request_data = {}
-        
-        try:
-            response = client.post("/api/v1/passkey/authenticate/begin", json=request_data)
-            
-            assert response.status_code == 200
-            data = response.json()
-            
-            # Check required WebAuthn fields
-            assert "challenge" in data
-            assert "allowCredentials" in data
-            assert "rpId" in data
-            assert data["rpId"] == "localhost"
-        finally:
-            app.dependency_overrides.clear()
-
-
-class TestWebAuthnService:
-    """Test WebAuthn service functionality."""
+        # Check required WebAuthn fields
+        assert options.challenge
+        assert options.allowCredentials == []
+        assert options.rpId == "localhost"
     
-    def test_generate_challenge(self):
-        """Test challenge generation."""
-        challenge = webauthn_service.generate_challenge()
-        
-        # Challenge should be base64 encoded string
-        assert isinstance(challenge, str)
-        assert len(challenge) > 0
-        
-        # Should be able to decode
-        import base64
-        decoded = base64.urlsafe_b64decode(challenge + '==')
-        assert len(decoded) >= 16  # At least 16 bytes
-    
-    def test_challenge_storage_and_retrieval(self):
-        """Test storing and retrieving challenges."""
-        challenge = "test_challenge_123"
-        user_id = 123  # Use numeric user ID
-        
-        # Store challenge
-        webauthn_service.store_challenge(user_id, challenge)
+    @pytest.mark.parametrize(
+        ("stored_sign_count", "presented_sign_count"),
+        [(0, 1), (5, 6), (10, 15)],
+        ids=["first_use", "next_count", "counter_jump"],
+    )
+    async def test_complete_passkey_authentication(
+        self, async_client, passkey_repo, registered_authenticator,
+        stored_sign_count, presented_sign_count
+    ):
+        """Test signing in with a registered credential's real assertion."""
+        await passkey_repo.update_sign_count(registered_authenticator.id, stored_sign_count)
+        # get() advances the counter before signing
+        registered_authenticator.sign_count = presented_sign_count - 1
         
-        # Retrieve challenge
-        stored_challenge = webauthn_service.get_challenge(user_id)
-        assert stored_challenge == challenge
+        options = (await async_client.post(
+            "/api/v1/passkey/authenticate/begin", json={"username": "testuser"}
+        )).json()
+        response = await async_client.post(
+            "/api/v1/passkey/authenticate/complete", json=registered_authenticator.get(options)
+        )
         
-        # Challenge should still be available (not consumed automatically)
-        available_challenge = webauthn_service.get_challenge(user_id)
-        assert available_challenge == challenge
+        assert response.status_code == 200
+        data = response.json()
+        assert data["token_type"] == "bearer"
+        assert data["user"]["username"] == "testuser"
         
-        # Clear challenge manually
-        webauthn_service.clear_challenge(user_id)
-        cleared_challenge = webauthn_service.get_challenge(user_id)
-        assert cleared_challenge is None
+        credential = await passkey_repo.get_by_credential_id(registered_authenticator.id)
+        assert credential.sign_count == presented_sign_count
+
+
+class TestPasskeyCredentialManagement:
+    """Test passkey credential management endpoints."""
     
-    def test_challenge_expiration(self):
-        """Test challenge expiration."""
-        import time
-        
-        challenge = "test_challenge_expired"
-        user_id = 124  # Use numeric user ID
+    async def test_list_user_passkeys(self, async_client, auth_headers, stored_credentials):
+        """Test listing the current user's passkeys."""
+        response = await async_client.get("/api/v1/passkey/credentials", headers=auth_headers)
         
-        # Store challenge with short expiration
-        webauthn_service.store_challenge(user_id, challenge, expires_in=1)
-        
-        # Should be available immediately
-        stored_challenge = webauthn_service.get_challenge(user_id)
-        assert stored_challenge == challenge
-        
-        # Store again and wait for expiration
-        webauthn_service.store_challenge(user_id, challenge, expires_in=1)
-        time.sleep(2)
-        
-        # Should be expired
-        expired_challenge = webauthn_service.get_challenge(user_id)
-        assert expired_challenge is None
+        assert response.status_code == 200
+        listed = {credential["credential_id"] for credential in response.json()}
+        assert {credential.credential_id for credential in stored_credentials} <= listed
+
+
+def _unregistered_attestation():
+    """Attestation from an authenticator the server has never seen."""
+    return VirtualAuthenticator().create({"rp": {"id": "localhost"}, "challenge": "unused"})
+
+
+def _unregistered_assertion():
+    """Assertion from an authenticator the server has never seen."""
+    return VirtualAuthenticator().get({"rpId": "localhost", "challenge": "unused"})
+
+
+class TestPasskeyCompletionFailures:
+    """Test rejected passkey completion requests."""
     
-    def test_create_registration_options(self):
-        """Test creating registration options."""
-        user_id = 123
-        username = 'testuser'
-        display_name = 'Test User'
-        
-        options = webauthn_service.create_registration_options(user_id, username, display_name)
+    @pytest.mark.parametrize(
+        ("endpoint", "payload_factory", "status_code", "detail"),
+        [
+            ("register/complete", _unregistered_attestation, 403, "Not authenticated"),
+            ("authenticate/complete", _unregistered_assertion, 404, "Credential not found"),
+        ],
+        ids=["register_without_token", "unknown_credential"],
+    )
+    async def test_completion_rejected(self, async_client, endpoint, payload_factory, status_code, detail):
+        """Test that completion fails with the expected status and reason."""
+        response = await async_client.post(f"/api/v1/passkey/{endpoint}", json=payload_factory())
         
-        assert "challenge" in options
-        assert "rp" in options
-        assert "user" in options
-        assert "pubKeyCredParams" in options
-        assert options["rp"]["id"] == "localhost"
-        assert options["user"]["name"] == username
-        assert options["user"]["displayName"] == display_name
+        assert response.status_code == status_code
+        assert detail in response.json()["detail"]
     
-    def test_create_authentication_options(self):
-        """Test creating authentication options."""
-        credentials = []  # Empty for usernameless authentication
+    async def test_completion_rejects_wrong_challenge(
+        self, async_client, registered_authenticator, seeded_challenge
+    ):
+        """Test that an assertion over a challenge never issued is rejected."""
+        assertion = registered_authenticator.get({"rpId": "localhost", "challenge": "wrong_challenge"})
         
-        result = webauthn_service.create_authentication_options(allow_credentials=credentials)
-        options, challenge = result
+        response = await async_client.post("/api/v1/passkey/authenticate/complete", json=assertion)
         
-        assert "challenge" in options
-        assert "allowCredentials" in options
-        assert "rpId" in options
-        assert options["rpId"] == "localhost"
-        assert isinstance(options["allowCredentials"], list)
-        assert isinstance(challenge, str)
\ No newline at end of file
+        assert response.status_code == 401
+        assert "Challenge mismatch" in response.json()["detail"]
@@ -0,0 +1,131 @@
+"""Tests for the passkey credential repository."""
+import pytest
+import pytest_asyncio
+from sqlalchemy.exc import IntegrityError
+
+from app.auth.passkey_models import PasskeyCredentialCreate
+from app.models.entities import PasskeyCredential
+
+
+# Validated once at import; the tests only read them
+CREDENTIAL_DATA_1 = PasskeyCredentialCreate(
+    credential_id="credential_1", public_key=b"public_key_1", name="Key 1"
+)
+CREDENTIAL_DATA_2 = PasskeyCredentialCreate(
+    credential_id="credential_2", public_key=b"public_key_2", name="Key 2"
+)
+
+
+@pytest_asyncio.fixture
+async def credential(passkey_repo, test_user):
+    """One active credential for ``test_user``."""
+    return await passkey_repo.create(test_user.id, CREDENTIAL_DATA_1)
+
+
+class TestPasskeyCredentialRepository:
+    """Test passkey credential repository queries."""
+    
+    async def test_create_credential(self, test_user, credential):
+        """Test that a new credential gets its defaults."""
+        assert credential.user_id == test_user.id
+        assert credential.sign_count == 0
+        assert credential.is_active is True
+        assert credential.created_at is not None
+    
+    async def test_get_by_user_id(self, passkey_repo, test_user):
+        """Test listing every credential a user owns."""
+        assert await passkey_repo.get_by_user_id(test_user.id) == []
+        
+        await passkey_repo.bulk_create(test_user.id, [CREDENTIAL_DATA_1, CREDENTIAL_DATA_2])
+        
+        credentials = await passkey_repo.get_by_user_id(test_user.id)
+        
+        assert {credential.credential_id for credential in credentials} == {
+            "credential_1", "credential_2"
+        }
+    
+    async def test_get_credential_ids_for_user(self, passkey_repo, test_user):
+        """Test listing a user's credential IDs."""
+        await passkey_repo.bulk_create(test_user.id, [CREDENTIAL_DATA_1, CREDENTIAL_DATA_2])
+        
+        credential_ids = await passkey_repo.get_credential_ids_for_user(test_user.id)
+        
+        assert sorted(credential_ids) == ["credential_1", "credential_2"]
+    
+    async def test_get_credential_ids_excludes_inactive(self, db_session, passkey_repo, test_user):
+        """Test that deactivated credentials are not listed."""
+        # Insert the inactive row as such rather than creating and deactivating it
+        db_session.add_all([
+            PasskeyCredential(
+                user_id=test_user.id, credential_id="active_cred", public_key=b"public_key_1"
+            ),
+            PasskeyCredential(
+                user_id=test_user.id, credential_id="inactive_cred", public_key=b"public_key_2",
+                is_active=False
+            ),
+        ])
+        await db_session.flush()
+        
+        credential_ids = await passkey_repo.get_credential_ids_for_user(test_user.id)
+        
+        assert credential_ids == ["active_cred"]
+    
+    async def test_update_sign_count(self, db_session, passkey_repo, credential):
+        """Test that a new sign count and last-used time are persisted."""
+        assert await passkey_repo.update_sign_count("credential_1", 5) is True
+        
+        # Reload just the updated columns of the row we already hold
+        await db_session.refresh(credential, ["sign_count", "last_used"])
+        assert credential.sign_count == 5
+        assert credential.last_used is not None
+    
+    async def test_deactivate_credential(self, passkey_repo, test_user, credential):
+        """Test that a deactivated credential no longer counts as active."""
+        assert await passkey_repo.exists_active("credential_1") is True
+        
+        assert await passkey_repo.deactivate("credential_1", test_user.id) is True
+        assert await passkey_repo.exists_active("credential_1") is False
+    
+    async def test_delete_credential(self, passkey_repo, test_user, credential):
+        """Test that a deleted credential is gone."""
+        assert await passkey_repo.delete("credential_1", test_user.id) is True
+        assert await passkey_repo.exists_active("credential_1") is False
+    
+    @pytest.mark.parametrize("method", ["deactivate", "delete"])
+    async def test_modify_credential_wrong_user(self, passkey_repo, test_user, credential, method):
+        """Test that another user's credential is left untouched."""
+        # False means no row matched, so the credential is still active
+        assert await getattr(passkey_repo, method)("credential_1", test_user.id + 1) is False
+        assert await passkey_repo.exists_active("credential_1") is True
+    
+    @pytest.mark.parametrize(
+        ("method", "args"),
+        [
+            ("update_sign_count", (5,)),
+            ("deactivate", (1,)),
+            ("delete", (1,)),
+        ],
+    )
+    async def test_modify_credential_not_found(self, passkey_repo, method, args):
+        """Test that modifying an unknown credential reports no change."""
+        assert await getattr(passkey_repo, method)("non_existent_credential", *args) is False
+    
+    async def test_get_by_credential_id(self, passkey_repo, test_user, credential):
+        """Test fetching a credential together with its user."""
+        found = await passkey_repo.get_by_credential_id("credential_1", load_user=True)
+        
+        assert found.id == credential.id
+        assert found.user.username == test_user.username
+        assert await passkey_repo.get_by_credential_id("non_existent_credential") is None
+    
+    async def test_create_credential_with_duplicate_id(self, db_session, passkey_repo, test_user, credential):
+        """Test that a credential ID can only be registered once."""
+        # The savepoint absorbs the failed INSERT, leaving the session usable
+        with pytest.raises(IntegrityError):
+            async with db_session.begin_nested():
+                await passkey_repo.create(
+                    test_user.id,
+                    PasskeyCredentialCreate(credential_id="credential_1", public_key=b"public_key_2"),
+                )
+        
+        assert await passkey_repo.get_credential_ids_for_user(test_user.id) == ["credential_1"]
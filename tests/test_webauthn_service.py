@@ -1,19 +1,63 @@
 """Tests for WebAuthn service functionality."""
 import base64
-import json
 import secrets
-from unittest.mock import patch
 
+import orjson
 import pytest
-from app.auth.webauthn_service import WebAuthnService
+from app.auth.webauthn_service import WebAuthnService, webauthn_service
+
+
+def _b64u(data: bytes) -> str:
+    """Encode bytes as unpadded base64url, as WebAuthn clients send them."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+REGISTRATION_OPTION_KEYS = frozenset({
+    "challenge", "rp", "user", "pubKeyCredParams", "timeout", "attestation",
+    "authenticatorSelection",
+})
+AUTHENTICATION_OPTION_KEYS = frozenset({
+    "challenge", "timeout", "rpId", "allowCredentials", "userVerification",
+})
+
+# Assertion payload signed over the wrong challenge; encoded once at import
+_MISMATCHED_AUTHENTICATION_RESPONSE = {
+    "response": {
+        "authenticatorData": _b64u(b"mock_auth_data"),
+        "clientDataJSON": _b64u(orjson.dumps(
+            {"challenge": "wrong_challenge", "origin": "http://localhost:8000"}
+        )),
+        "signature": _b64u(b"mock_signature"),
+    }
+}
+
+
+@pytest.fixture(scope="module")
+def registration():
+    """Registration options built once, with the service that issued them."""
+    service = WebAuthnService(rp_id="localhost", rp_name="Test App")
+    return service, service.create_registration_options(1, "testuser", "Test User")
+
+
+@pytest.fixture(scope="module")
+def authentication():
+    """Authentication options and challenge built once, with their service."""
+    service = WebAuthnService(rp_id="localhost", rp_name="Test App")
+    return (service, *service.create_authentication_options(1))
 
 
 class TestWebAuthnService:
     """Test WebAuthn service core functionality."""
     
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.service = WebAuthnService(rp_id="localhost", rp_name="Test App")
+    @pytest.fixture(autouse=True, scope="class")
+    def service(self, request):
+        """One service for the whole class, reached as ``self.service``."""
+        request.cls.service = WebAuthnService(rp_id="localhost", rp_name="Test App")
+    
+    @pytest.fixture(autouse=True)
+    def clear_challenges(self, service):
+        """Start every test with an empty challenge store."""
+        self.service.challenge_cache.clear()
     
     def test_generate_challenge(self):
         """Test challenge generation."""
@@ -24,87 +68,84 @@ class TestWebAuthnService:
         assert len(challenge) > 0
         
         # Should be decodable
-        decoded = base64.urlsafe_b64decode(challenge + '==')
+        decoded = base64.urlsafe_b64decode(challenge + '=' * (-len(challenge) % 4))
         assert len(decoded) == 32
     
-    def test_store_and_get_challenge(self):
-        """Test challenge storage and retrieval."""
+    @pytest.mark.parametrize(
+        ("expires_in", "clear", "expected"),
+        [
+            (300, False, "test_challenge"),
+            (-1, False, None),
+            (300, True, None),
+        ],
+        ids=["stored", "expired", "cleared"],
+    )
+    def test_get_challenge(self, expires_in, clear, expected):
+        """Test challenge retrieval after storing, expiring and clearing."""
         user_id = 1
-        challenge = "test_challenge"
         
-        # Store challenge
-        self.service.store_challenge(user_id, challenge)
+        self.service.store_challenge(user_id, "test_challenge", expires_in=expires_in)
+        if clear:
+            self.service.clear_challenge(user_id)
         
-        # Retrieve challenge
-        retrieved = self.service.get_challenge(user_id)
-        assert retrieved == challenge
+        assert self.service.get_challenge(user_id) == expected
     
-    def test_get_expired_challenge(self):
-        """Test that expired challenges return None."""
+    def test_challenge_expires_after_ttl(self):
+        """Test that a challenge is served until its TTL elapses."""
+        now = 0
+        # Clock the service reads; the test moves it forward by hand
+        service = WebAuthnService(rp_id="localhost", rp_name="Test App", clock=lambda: now)
         user_id = 1
         challenge = "test_challenge"
         
-        # Store with very short expiry
-        self.service.store_challenge(user_id, challenge, expires_in=-1)
+        service.store_challenge(user_id, challenge, expires_in=1)
+        assert service.get_challenge(user_id) == challenge
         
-        # Should return None for expired challenge
-        retrieved = self.service.get_challenge(user_id)
-        assert retrieved is None
+        # Reading does not consume the challenge
+        assert service.get_challenge(user_id) == challenge
+        
+        now += 2_000_000_000
+        assert service.get_challenge(user_id) is None
     
-    def test_clear_challenge(self):
-        """Test challenge clearing."""
-        user_id = 1
-        challenge = "test_challenge"
+    def test_get_challenge_only_expires_requested_key(self):
+        """Test that a lookup purges the requested entry, not the whole store."""
+        for user_id in range(1000):
+            self.service.store_challenge(user_id, "stale", expires_in=-1)
+        self.service.store_challenge(1000, "test_challenge")
         
-        # Store and clear
-        self.service.store_challenge(user_id, challenge)
-        self.service.clear_challenge(user_id)
+        assert self.service.get_challenge(1000) == "test_challenge"
+        assert len(self.service.challenge_cache) == 1001
         
-        # Should return None after clearing
-        retrieved = self.service.get_challenge(user_id)
-        assert retrieved is None
+        assert self.service.get_challenge(0) is None
+        assert 0 not in self.service.challenge_cache
+        assert len(self.service.challenge_cache) == 1000
     
-    def test_create_registration_options(self):
+    def test_create_registration_options(self, registration):
         """Test WebAuthn registration options creation."""
-        user_id = 1
-        username = "testuser"
-        display_name = "Test User"
-        
-        options = self.service.create_registration_options(user_id, username, display_name)
+        service, options = registration
         
         # Check required fields
-        assert "challenge" in options
-        assert "rp" in options
-        assert "user" in options
-        assert "pubKeyCredParams" in options
-        assert "timeout" in options
-        assert "attestation" in options
-        assert "authenticatorSelection" in options
+        assert REGISTRATION_OPTION_KEYS <= options.keys()
         
         # Check values
         assert options["rp"]["id"] == "localhost"
         assert options["rp"]["name"] == "Test App"
-        assert options["user"]["name"] == username
-        assert options["user"]["displayName"] == display_name
+        assert options["user"]["id"] == _b64u(b"1")
+        assert options["user"]["name"] == "testuser"
+        assert options["user"]["displayName"] == "Test User"
         assert options["timeout"] == 60000
         assert options["attestation"] == "none"
         
         # Check that challenge is stored
-        stored_challenge = self.service.get_challenge(user_id)
+        stored_challenge = service.get_challenge(1)
         assert stored_challenge == options["challenge"]
     
-    def test_create_authentication_options(self):
+    def test_create_authentication_options(self, authentication):
         """Test WebAuthn authentication options creation."""
-        user_id = 1
-        
-        options, challenge = self.service.create_authentication_options(user_id)
+        service, options, challenge = authentication
         
         # Check required fields
-        assert "challenge" in options
-        assert "timeout" in options
-        assert "rpId" in options
-        assert "allowCredentials" in options
-        assert "userVerification" in options
+        assert AUTHENTICATION_OPTION_KEYS <= options.keys()
         
         # Check values
         assert options["rpId"] == "localhost"
@@ -113,15 +154,43 @@ class TestWebAuthnService:
         assert isinstance(options["allowCredentials"], list)
         
         # Check that challenge is stored
-        stored_challenge = self.service.get_challenge(user_id)
+        stored_challenge = service.get_challenge(1)
         assert stored_challenge == challenge
     
+    def test_registration_options_do_not_share_state(self):
+        """Test that editing one response leaves the next one intact."""
+        options = self.service.create_registration_options(1, "testuser", "Test User", ["credential_1"])
+        options["rp"]["id"] = "evil.example"
+        options["pubKeyCredParams"][0]["alg"] = 0
+        options["authenticatorSelection"]["userVerification"] = "discouraged"
+        options["excludeCredentials"][0]["transports"].append("usb")
+        
+        fresh = self.service.create_registration_options(2, "otheruser", "Other User", ["credential_2"])
+        
+        assert fresh["rp"]["id"] == "localhost"
+        assert fresh["pubKeyCredParams"][0]["alg"] == -7
+        assert fresh["authenticatorSelection"]["userVerification"] == "required"
+        assert fresh["excludeCredentials"][0]["transports"] == ["internal"]
+    
+    def test_options_accept_credential_iterables(self):
+        """Test that credential IDs can be streamed from any iterable."""
+        options = self.service.create_registration_options(
+            1, "testuser", "Test User", (f"credential_{i}" for i in range(100))
+        )
+        auth_options, _ = self.service.create_authentication_options(
+            1, (f"credential_{i}" for i in range(50))
+        )
+        
+        assert [c["id"] for c in options["excludeCredentials"]] == [f"credential_{i}" for i in range(100)]
+        assert len(auth_options["allowCredentials"]) == 50
+        assert {c["type"] for c in auth_options["allowCredentials"]} == {"public-key"}
+    
     def test_create_authentication_options_usernameless(self):
         """Test usernameless authentication options."""
         options, challenge = self.service.create_authentication_options()
         
         # Should still create valid options without user_id
-        assert "challenge" in options
+        assert AUTHENTICATION_OPTION_KEYS <= options.keys()
         assert options["rpId"] == "localhost"
         assert isinstance(challenge, str)
         assert len(challenge) > 0
@@ -152,20 +221,28 @@ class TestWebAuthnService:
         assert not success
         assert "No challenge found" in result["error"]
     
+    @pytest.mark.parametrize(
+        "malformed_response",
+        [
+            {},
+            {"response": None},
+            {"response": {}},
+            {"response": {"clientDataJSON": "mock_client_data"}},
+        ],
+        ids=["no_response", "null_response", "empty_response", "missing_attestation"],
+    )
+    def test_verify_registration_response_malformed(self, malformed_response):
+        """Test registration verification rejects payloads missing fields."""
+        self.service.store_challenge(1, "test_challenge")
+        
+        success, result = self.service.verify_registration_response(1, malformed_response)
+        assert not success
+        assert result["error"] == "Missing required response fields"
+    
     def test_verify_authentication_response_challenge_mismatch(self):
         """Test authentication verification fails with wrong challenge."""
-        mock_response = {
-            "response": {
-                "authenticatorData": base64.urlsafe_b64encode(b"mock_auth_data").decode(),
-                "clientDataJSON": base64.urlsafe_b64encode(
-                    json.dumps({"challenge": "wrong_challenge", "origin": "http://localhost:8000"}).encode()
-                ).decode(),
-                "signature": base64.urlsafe_b64encode(b"mock_signature").decode()
-            }
-        }
-        
         success, result = self.service.verify_authentication_response(
-            "credential_id", b"public_key", 0, mock_response, "correct_challenge"
+            "credential_id", b"public_key", 0, _MISMATCHED_AUTHENTICATION_RESPONSE, "correct_challenge"
         )
         
         assert not success
@@ -177,8 +254,6 @@ class TestWebAuthnServiceGlobal:
     
     def test_global_instance_creation(self):
         """Test that global service instance is created properly."""
-        from app.auth.webauthn_service import webauthn_service
-        
         assert webauthn_service is not None
         assert isinstance(webauthn_service, WebAuthnService)
         assert webauthn_service.rp_id == "localhost"  # From default config
\ No newline at end of file